@@ -0,0 +1,357 @@
+"""
+agent.py
+
+This module contains the reporting agent of the Clean My Windows application.
+The agent periodically runs the headless scan (and optionally clean) and
+uploads the results to a collector over HTTP.
+
+The result of every run is written to a spool directory on disk as soon as
+the run finishes. Spooled results are uploaded oldest first, combined into
+gzip compressed JSON batches, over a single keep-alive connection. They stay
+on disk until the collector accepts them, and uploads are retried with
+exponential backoff while it is unreachable.
+
+Classes:
+- Reporter: Spools results and uploads them in compressed batches.
+
+Functions:
+- run_agent: Runs the headless scan periodically and reports the results.
+"""
+
+
+import gzip
+import http.client
+import json
+import os
+import socket
+import time
+from urllib.parse import urlsplit
+
+from .filters import compile_filter
+from .headless import run_headless
+from .paths import AGENT_SPOOL_DIR
+
+# Bounds of the delay between upload attempts while the collector is unreachable
+MIN_BACKOFF = 30
+MAX_BACKOFF = 60 * 60
+
+# Max. no. of results kept on disk, the oldest ones are dropped beyond this
+MAX_SPOOLED_RESULTS = 5000
+
+# Max. no. of batches rejected by the collector kept on disk for inspection
+MAX_REJECTED_BATCHES = 100
+
+# Responses after which the same batch may be accepted later
+RETRY_STATUSES = {408, 429}
+
+
+class Reporter:
+    """
+    Spools run results and uploads them to a collector in compressed batches.
+
+    Attributes:
+        url (str): URL of the collector, e.g. "http://collector:8080/reports".
+        spool_dir (str): Directory to keep results in until they are uploaded.
+        batch_size (int): Max. no. of results per upload.
+        max_delay (float): Max. age of a result in seconds before it's uploaded
+            without waiting for a full batch.
+
+    Methods:
+        __init__: Initializes the Reporter instance.
+        add: Writes a result to the spool directory.
+        send: Uploads the spooled results.
+        close: Closes the connection to the collector.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        spool_dir: str = AGENT_SPOOL_DIR,
+        batch_size: int = 6,
+        max_delay: float = 60 * 60,
+        timeout: float = 30,
+    ):
+        """
+        Initialize the Reporter instance.
+
+        :param url: URL of the collector
+        :param spool_dir: Directory to keep results in until they are uploaded
+        :param batch_size: Max. no. of results per upload
+        :param max_delay: Max. age of a result in seconds before it's uploaded
+            without waiting for a full batch
+        :param timeout: Timeout of connecting and uploading in seconds
+        :raises ValueError: If the URL isn't an http or https URL
+        """
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"Invalid collector URL '{url}'")
+
+        self.url = url
+        self.spool_dir = spool_dir
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.timeout = timeout
+
+        self._scheme = parts.scheme
+        self._host = parts.hostname
+        self._port = parts.port
+        self._path = parts.path or "/"
+        if parts.query:
+            self._path += f"?{parts.query}"
+
+        self._connection = None
+        self._backoff = 0
+        self._retry_at = 0
+
+        os.makedirs(self.spool_dir, exist_ok=True)
+
+    def add(self, result: dict) -> None:
+        """
+        Write a result to the spool directory.
+
+        :param result: Result of a run, as returned by `run_headless`
+        :type result: dict
+        """
+        path = os.path.join(self.spool_dir, f"{time.time_ns()}.json")
+
+        # Write to a temporary file first so send never sees a partial result
+        with open(f"{path}.part", "w") as file:
+            json.dump(result, file)
+        os.replace(f"{path}.part", path)
+
+        # Drop the oldest results if the collector has been unreachable for long
+        for name in self._spooled()[:-MAX_SPOOLED_RESULTS]:
+            os.remove(os.path.join(self.spool_dir, name))
+
+    def send(self) -> int:
+        """
+        Upload the spooled results in batches, oldest first.
+
+        Nothing is uploaded until a full batch is spooled or the oldest result
+        is older than `max_delay`, nor while backing off after a failed upload.
+        Batches the collector rejects for good are moved aside, so they don't
+        hold up the later ones.
+
+        :return: No. of results uploaded
+        :rtype: int
+        """
+        if time.monotonic() < self._retry_at:
+            return 0
+
+        spooled = self._spooled()
+        if not spooled:
+            return 0
+
+        oldest = int(spooled[0].split(".")[0]) / 1e9
+        if len(spooled) < self.batch_size and time.time() - oldest < self.max_delay:
+            return 0
+
+        sent = 0
+        for start in range(0, len(spooled), self.batch_size):
+            names, results = self._load(spooled[start : start + self.batch_size])
+            if not results:
+                continue
+
+            body = gzip.compress(json.dumps({"results": results}).encode())
+            try:
+                status = self._post(body)
+            except (OSError, http.client.HTTPException):
+                self._back_off()
+                break
+
+            if status >= 500 or status in RETRY_STATUSES:
+                self._back_off()
+                break
+
+            self._backoff = 0
+            if status >= 300:
+                self._reject(names)
+                continue
+
+            for name in names:
+                os.remove(os.path.join(self.spool_dir, name))
+            sent += len(names)
+
+        return sent
+
+    def close(self) -> None:
+        """Close the connection to the collector."""
+        if self._connection:
+            self._connection.close()
+            self._connection = None
+
+    def _spooled(self, suffix: str = ".json") -> list:
+        """Return names of the spooled files with a suffix, oldest first."""
+        return sorted(
+            name for name in os.listdir(self.spool_dir) if name.endswith(suffix)
+        )
+
+    def _load(self, names: list) -> tuple:
+        """
+        Read spooled results, moving aside the ones that can't be read.
+
+        :param names: Names of the spooled results
+        :type names: list
+        :return: Names and contents of the results that could be read
+        :rtype: tuple
+        """
+        loaded = []
+        results = []
+
+        for name in names:
+            try:
+                with open(os.path.join(self.spool_dir, name)) as file:
+                    results.append(json.load(file))
+            except (OSError, ValueError):
+                self._reject([name])
+            else:
+                loaded.append(name)
+
+        return loaded, results
+
+    def _reject(self, names: list) -> None:
+        """
+        Move spooled results aside, keeping only the latest rejected ones.
+
+        :param names: Names of the spooled results
+        :type names: list
+        """
+        for name in names:
+            path = os.path.join(self.spool_dir, name)
+            os.replace(path, f"{path}.rejected")
+
+        for name in self._spooled(".rejected")[:-MAX_REJECTED_BATCHES]:
+            os.remove(os.path.join(self.spool_dir, name))
+
+    def _back_off(self) -> None:
+        """Delay the next upload attempt, doubling the delay each time."""
+        self._backoff = min(max(2 * self._backoff, MIN_BACKOFF), MAX_BACKOFF)
+        self._retry_at = time.monotonic() + self._backoff
+
+    def _post(self, body: bytes) -> int:
+        """
+        Upload a batch, reusing the connection to the collector.
+
+        The collector may have closed an idle connection since the last
+        upload, so if a reused connection fails before any response arrives,
+        the batch is sent once more over a new connection.
+
+        :param body: Gzip compressed JSON batch
+        :type body: bytes
+        :return: Status of the response
+        :rtype: int
+        :raises OSError: If the collector is unreachable
+        """
+        if self._connection is not None:
+            try:
+                return self._request(body)
+            except ConnectionError:
+                # Covers RemoteDisconnected, raised when no response arrived
+                pass
+
+        if self._scheme == "https":
+            connection_class = http.client.HTTPSConnection
+        else:
+            connection_class = http.client.HTTPConnection
+        self._connection = connection_class(
+            self._host, self._port, timeout=self.timeout
+        )
+
+        return self._request(body)
+
+    def _request(self, body: bytes) -> int:
+        """
+        Send a batch over the current connection, closing it on failure.
+
+        :param body: Gzip compressed JSON batch
+        :type body: bytes
+        :return: Status of the response
+        :rtype: int
+        :raises OSError: If the collector is unreachable
+        """
+        try:
+            self._connection.request(
+                "POST",
+                self._path,
+                body,
+                headers={
+                    "Content-Type": "application/json",
+                    "Content-Encoding": "gzip",
+                },
+            )
+            response = self._connection.getresponse()
+        except (OSError, http.client.HTTPException):
+            self.close()
+            raise
+
+        try:
+            # Read the whole response so the connection can be reused
+            response.read()
+        except (OSError, http.client.HTTPException) as error:
+            self.close()
+            # The collector has answered, so the batch mustn't be sent again
+            raise http.client.HTTPException("Response was cut off") from error
+
+        if response.will_close:
+            self.close()
+
+        return response.status
+
+
+def run_agent(
+    url: str,
+    interval: float = 600,
+    clean: bool = False,
+    filter_expression: str | None = None,
+    parallel: bool = False,
+) -> None:
+    """
+    Run the headless scan periodically and report the results to a collector.
+
+    Runs until interrupted. Each result is written to the spool directory
+    right after its run, so results survive the agent being killed. A run
+    that fails is reported with its error and the agent keeps running.
+
+    :param url: URL of the collector
+    :type url: str
+    :param interval: Delay between runs in seconds
+    :type interval: float
+    :param clean: Whether to clean the directories after scanning them
+    :type clean: bool
+    :param filter_expression: Filter selecting files, all files if None. It's
+        compiled on every run, so that age terms are relative to that run.
+    :type filter_expression: str | None
+    :param parallel: Whether to scan large directories in worker processes
+    :type parallel: bool
+    """
+    reporter = Reporter(url)
+
+    try:
+        while True:
+            started = time.time()
+            try:
+                file_filter = compile_filter(filter_expression)
+                result = run_headless(clean, file_filter, parallel)
+            except Exception as error:
+                # Report the failed run instead of stopping the agent
+                result = {
+                    "host": socket.gethostname(),
+                    "started": started,
+                    "duration": time.time() - started,
+                    "filter": filter_expression,
+                    "cleaned": clean,
+                    "error": f"{type(error).__name__}: {error}",
+                }
+
+            try:
+                reporter.add(result)
+                reporter.send()
+            except OSError:
+                # The spool directory is unusable for now, retry on the next run
+                pass
+
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        reporter.close()
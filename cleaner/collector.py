@@ -0,0 +1,84 @@
+"""
+collector.py
+
+This module contains a minimal local collector for the reports uploaded by the
+reporting agent, to test the agent without an external service. Each received
+result is appended as a line of JSON to an output file.
+
+Classes:
+- CollectorHandler: Handles report uploads.
+
+Functions:
+- serve: Runs the collector until interrupted.
+"""
+
+
+import gzip
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class CollectorHandler(BaseHTTPRequestHandler):
+    """
+    Handles report uploads from the agent.
+
+    Accepts POST requests with a (optionally gzip compressed) JSON body of the
+    form {"results": [...]} and keeps the connection alive between requests.
+
+    Methods:
+        do_POST: Stores the results of an upload.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        """Store the results of an upload."""
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            if length < 0:
+                raise ValueError("Content-Length must not be negative")
+            body = self.rfile.read(length)
+            if self.headers.get("Content-Encoding") == "gzip":
+                body = gzip.decompress(body)
+            results = json.loads(body)["results"]
+            if not isinstance(results, list):
+                raise TypeError("results must be a list")
+        except (OSError, ValueError, KeyError, TypeError):
+            self.send_error(400, "Invalid report")
+            return
+
+        with self.server.lock:
+            with open(self.server.output, "a") as file:
+                for result in results:
+                    file.write(json.dumps(result) + "\n")
+
+        self.send_response(204)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+def serve(
+    port: int = 8080, host: str = "127.0.0.1", output: str = "reports.jsonl"
+) -> None:
+    """
+    Run the collector until interrupted.
+
+    :param port: Port to listen on
+    :type port: int
+    :param host: Address to listen on
+    :type host: str
+    :param output: Path of the file to append the results to
+    :type output: str
+    """
+    server = ThreadingHTTPServer((host, port), CollectorHandler)
+    server.lock = threading.Lock()
+    server.output = output
+
+    print(f"Collecting reports on http://{host}:{port}/ into {output}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
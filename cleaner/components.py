@@ -14,12 +14,14 @@ Classes:
 
 
 import threading
+from concurrent.futures import ProcessPoolExecutor
 
 import customtkinter as ctk
 from PIL import Image
 
 from .utils import (
-    get_dir_size,
+    scan_dir,
+    scan_dir_parallel,
     get_formatted_size,
     get_cache_dirs,
     clean_dir,
@@ -38,10 +40,15 @@ class DirStat(ctk.CTkFrame):
         name (str): The name of the directory.
         dir_size (int): The size of the directory in bytes.
         path (str): The path to the directory.
+        disk_size (int): The size the directory occupies on disk in bytes.
+        matched_size (int | None): The size of the files matching the filter,
+            or None if no filter is active.
+        matched_disk_size (int | None): The size the matching files occupy on
+            disk, or None if no filter is active.
         state (str | None): The state of the directory (cleaned, error, or None).
 
     Methods:
-        __init__(self, master, name, dir_size, path):
+        __init__(self, master, name, dir_size, path, disk_size, ...):
             Initializes a new DirStat instance.
         state:
             Getter and setter property for the state of the directory.
@@ -60,7 +67,16 @@ class DirStat(ctk.CTkFrame):
         "error": ctk.CTkImage(Image.open("cleaner\\images\\error.png"), size=(25, 25)),
     }
 
-    def __init__(self, master, name, dir_size, path):
+    def __init__(
+        self,
+        master,
+        name,
+        dir_size,
+        path,
+        disk_size,
+        matched_size=None,
+        matched_disk_size=None,
+    ):
         super().__init__(master, fg_color="transparent")
         self.master = master
 
@@ -68,6 +84,9 @@ class DirStat(ctk.CTkFrame):
         self.name = name
         self.dir_size = dir_size
         self.path = path
+        self.disk_size = disk_size
+        self.matched_size = matched_size
+        self.matched_disk_size = matched_disk_size
         self.columnconfigure(0, weight=1)
 
         # Directory icon
@@ -96,10 +115,17 @@ class DirStat(ctk.CTkFrame):
         self.lbl_name = ctk.CTkLabel(self, text=self.name, text_color="gray1")
         self.lbl_name.grid(row=1, column=0, sticky="new")
 
-        # Size of the directory
-        self.lbl_size = ctk.CTkLabel(
-            self, text=get_formatted_size(self.dir_size), text_color="gray1"
+        # Size of the directory, along with the matching size if filtered
+        size_text = (
+            f"{get_formatted_size(self.dir_size)}\n"
+            f"On disk: {get_formatted_size(self.disk_size)}"
         )
+        if self.matched_size is not None:
+            size_text += (
+                f"\nMatch: {get_formatted_size(self.matched_size)}\n"
+                f"On disk: {get_formatted_size(self.matched_disk_size)}"
+            )
+        self.lbl_size = ctk.CTkLabel(self, text=size_text, text_color="gray1")
         self.lbl_size.grid(row=2, column=0, sticky="new")
 
         self.state = None
@@ -207,16 +233,29 @@ class MainFrame(ctk.CTkScrollableFrame):
         self.folder = None
         self.select_all = select_all
 
-    def add_stat(self, name: str, dir_path: str, dir_size: int) -> None:
+    def add_stat(
+        self,
+        name: str,
+        dir_path: str,
+        dir_size: int,
+        disk_size: int,
+        matched_size: int | None = None,
+        matched_disk_size: int | None = None,
+    ) -> None:
         """
         Add cache directory stat to main frame.
 
         :param name: Name of the directory.
         :param dir_path: Path of the directory.
         :param dir_size: Size of the directory in bytes.
+        :param disk_size: Size the directory occupies on disk in bytes.
+        :param matched_size: Size of the files matching the filter, if any.
+        :param matched_disk_size: Size the matching files occupy on disk, if any.
         """
         # Create a new DirStat instance for the given directory
-        self.folder = DirStat(self, name, dir_size, dir_path)
+        self.folder = DirStat(
+            self, name, dir_size, dir_path, disk_size, matched_size, matched_disk_size
+        )
 
         # Calculate the maximum number of columns based on available space
         MainFrame.MAX_COL = self.winfo_width() // (self.folder.winfo_reqwidth() + 130)
@@ -386,6 +425,8 @@ class Frame(ctk.CTkScrollableFrame):
         master: The parent widget.
         height: The height of the frame.
         fg_color: The foreground color of the frame.
+        file_filter: Filter selecting the files to clean, or None for all files.
+        parallel: Whether to scan large directories in worker processes.
 
     Methods:
         select_all: Checks or unchecks all the folders.
@@ -397,10 +438,12 @@ class Frame(ctk.CTkScrollableFrame):
         display_total_size: Displays the total size of the cache dirs.
     """
 
-    def __init__(self, master, height, fg_color):
+    def __init__(self, master, height, fg_color, file_filter=None, parallel=False):
         super().__init__(master=master, height=height, fg_color=fg_color)
         self.columnconfigure((0, 1), weight=1)
         self.master = master
+        self.file_filter = file_filter
+        self.parallel = parallel
 
         # Create a "Select All" checkbox
         self.checkbox_select_all = CCheckBox(
@@ -437,15 +480,30 @@ class Frame(ctk.CTkScrollableFrame):
 
     def _scan_directories(self):
         """Scan directories in a background thread."""
-        for name, dir_path in get_cache_dirs():
-            size = get_dir_size(dir_path)
-            self.frm_main.add_stat(
-                name=name,
-                dir_path=dir_path,
-                dir_size=size,
-            )
-            # Ensure that UI updates are done in the main thread
-            self.frm_main.after(0, self.frm_main.update)
+        # Worker processes are only started once a large directory is found
+        executor = ProcessPoolExecutor() if self.parallel else None
+
+        try:
+            for name, dir_path in get_cache_dirs():
+                if executor:
+                    found = scan_dir_parallel(dir_path, self.file_filter, executor)
+                else:
+                    found = scan_dir(dir_path, self.file_filter)
+
+                filtered = self.file_filter is not None
+                self.frm_main.add_stat(
+                    name=name,
+                    dir_path=dir_path,
+                    dir_size=found.size,
+                    disk_size=found.disk_size,
+                    matched_size=found.matched_size if filtered else None,
+                    matched_disk_size=found.matched_disk_size if filtered else None,
+                )
+                # Ensure that UI updates are done in the main thread
+                self.frm_main.after(0, self.frm_main.update)
+        finally:
+            if executor:
+                executor.shutdown()
 
         # Display total size of cache dirs and display option for cleaning
         # Ensure that UI updates are done in the main thread
@@ -492,11 +550,15 @@ class Frame(ctk.CTkScrollableFrame):
         self.btn_exit.configure(state="disabled")
 
         total_cleaned_size = 0
+        total_cleaned_disk_size = 0
         access_denied_files = 0
         for directory in self.frm_main.get_dirs():
             # Clean directory and keep track of cleaned size
-            cleaned_size, access_denied_f = clean_dir(directory.path)
+            cleaned_size, access_denied_f, cleaned_disk_size = clean_dir(
+                directory.path, self.file_filter
+            )
             total_cleaned_size += cleaned_size
+            total_cleaned_disk_size += cleaned_disk_size
             access_denied_files += access_denied_f
 
             # Update the state (check mark on folder)
@@ -505,10 +567,12 @@ class Frame(ctk.CTkScrollableFrame):
             else:
                 directory.state = "cleaned"
 
-            # Update the progress bar
-            self.prgbar.set(total_cleaned_size / self.total_size)
+            # Update the progress bar, total size is the size on disk
+            if self.total_size:
+                self.prgbar.set(min(total_cleaned_disk_size / self.total_size, 1))
             self.lbl_prgbar.configure(
-                text=f"Cleaned: {get_formatted_size(total_cleaned_size)}"
+                text=f"Cleaned: {get_formatted_size(total_cleaned_size)} "
+                f"({get_formatted_size(total_cleaned_disk_size)} on disk)"
             )
 
         if access_denied_files != 0:
@@ -528,19 +592,36 @@ class Frame(ctk.CTkScrollableFrame):
         self.btn_exit.configure(state="normal")
 
     def display_total_size(self):
-        """Display the total size of the cache dirs."""
+        """
+        Display the total size of the cache dirs.
+
+        If a filter is active, the size of the matching files is displayed
+        instead, since only those will be cleaned. Returns the size on disk.
+        """
         dirs = self.frm_main.winfo_children()
         size = 0
+        disk_size = 0
 
         for directory in dirs:
-            size += directory.dir_size
+            if self.file_filter is None:
+                size += directory.dir_size
+                disk_size += directory.disk_size
+            else:
+                size += directory.matched_size
+                disk_size += directory.matched_disk_size
+
+        label = "Total Size" if self.file_filter is None else "Matching Size"
+        text = (
+            f"{label}: {get_formatted_size(size)} "
+            f"({get_formatted_size(disk_size)} on disk)"
+        )
 
         self.lbl_total_size = ctk.CTkLabel(
             self,
-            text=f"Total Size: {get_formatted_size(size)}",
+            text=text,
             font=ctk.CTkFont("Calibri", 24, "bold"),
             text_color="light sea green",
         )
         self.lbl_total_size.grid(row=2, column=0, pady=10, columnspan=2, sticky="ew")
 
-        return size
+        return disk_size
@@ -0,0 +1,169 @@
+"""
+filters.py
+
+This module contains the file filter expression language used to restrict
+scanning and cleaning to a subset of files.
+
+An expression is a list of terms separated by whitespace, all of which must
+hold for a file to match:
+
+- `age>7d`: Modification time older than 7 days (units: s, m, h, d, w).
+- `size>1MB`: File size larger than 1 MB (units: B, KB, MB, GB).
+- `*.tmp`: File name matches the pattern. If several patterns are given,
+  any of them may match.
+- `!*.lock`: File name must not match the pattern.
+
+Comparisons support >, >=, < and <=. For example:
+    age>7d size>1MB !*.lock
+
+Classes:
+- FileFilter: A compiled filter expression.
+
+Functions:
+- compile_filter: Compile a filter expression.
+"""
+
+
+import operator
+import time
+from fnmatch import fnmatchcase
+from re import fullmatch, IGNORECASE
+
+OPERATORS = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+}
+
+# Characters of comparisons, which are never part of a name pattern
+COMPARISON_CHARS = "<>="
+
+# An older file has a smaller mtime, so age comparisons are flipped
+AGE_OPERATORS = {
+    ">": operator.lt,
+    ">=": operator.le,
+    "<": operator.gt,
+    "<=": operator.ge,
+}
+
+AGE_UNITS = {
+    "s": 1,
+    "m": 60,
+    "h": 60 * 60,
+    "d": 24 * 60 * 60,
+    "w": 7 * 24 * 60 * 60,
+}
+SIZE_UNITS = {"b": 1, "kb": 1024, "mb": 1024**2, "gb": 1024**3}
+
+
+class FileFilter:
+    """
+    Represents a compiled filter expression.
+
+    The expression is parsed once into plain comparisons against `os.stat_result`
+    fields, so it can be evaluated against the stat data a directory traversal
+    has already fetched. Instances hold no closures and can be pickled.
+
+    Attributes:
+        expression (str): The source expression.
+
+    Methods:
+        __init__: Parses the expression.
+        matches: Checks whether a file matches the filter.
+    """
+
+    def __init__(self, expression: str, now: float | None = None):
+        """
+        Parse a filter expression.
+
+        :param expression: Filter expression, e.g. "age>7d size>1MB !*.lock"
+        :param now: Reference time for age terms, defaults to current time
+        :raises ValueError: If the expression contains an invalid term
+        """
+        self.expression = expression
+        self._checks = []
+        self._include = []
+        self._exclude = []
+
+        if now is None:
+            now = time.time()
+
+        for term in expression.split():
+            if term.startswith("!"):
+                if not term[1:]:
+                    raise ValueError(f"Empty pattern in term '{term}'")
+                # A comparison here would silently become a pattern matching nothing
+                if any(char in term for char in COMPARISON_CHARS):
+                    raise ValueError(
+                        f"Invalid filter term '{term}', only patterns can be negated"
+                    )
+                self._exclude.append(term[1:].lower())
+                continue
+
+            matches = fullmatch(
+                r"(age|size)(>=|<=|>|<)(\d+(?:\.\d+)?)([a-z]*)", term, IGNORECASE
+            )
+            if not matches:
+                if any(char in term for char in COMPARISON_CHARS):
+                    raise ValueError(f"Invalid filter term '{term}'")
+                self._include.append(term.lower())
+                continue
+
+            field, op, value, unit = matches.groups()
+            field, unit = field.lower(), unit.lower()
+            value = float(value)
+
+            if field == "age":
+                if unit not in AGE_UNITS:
+                    raise ValueError(
+                        f"Invalid age unit in '{term}', use s, m, h, d or w"
+                    )
+                cutoff = now - value * AGE_UNITS[unit]
+                self._checks.append(("st_mtime", AGE_OPERATORS[op], cutoff))
+            else:
+                if unit not in SIZE_UNITS:
+                    raise ValueError(
+                        f"Invalid size unit in '{term}', use B, KB, MB or GB"
+                    )
+                threshold = value * SIZE_UNITS[unit]
+                self._checks.append(("st_size", OPERATORS[op], threshold))
+
+    def matches(self, name: str, stat) -> bool:
+        """
+        Check whether a file matches the filter.
+
+        :param name: Name of the file
+        :type name: str
+        :param stat: Stat data of the file, e.g. from `os.DirEntry.stat`
+        :type stat: os.stat_result
+        :return: True if the file matches all terms
+        :rtype: bool
+        """
+        for field, op, threshold in self._checks:
+            if not op(getattr(stat, field), threshold):
+                return False
+
+        name = name.lower()
+        if self._include and not any(fnmatchcase(name, p) for p in self._include):
+            return False
+
+        return not any(fnmatchcase(name, p) for p in self._exclude)
+
+    def __repr__(self):
+        return f"FileFilter({self.expression!r})"
+
+
+def compile_filter(expression: str | None) -> FileFilter | None:
+    """
+    Compile a filter expression.
+
+    :param expression: Filter expression
+    :type expression: str | None
+    :return: Compiled filter, or None if the expression is empty
+    :rtype: FileFilter | None
+    """
+    if not expression or not expression.strip():
+        return None
+
+    return FileFilter(expression)
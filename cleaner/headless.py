@@ -0,0 +1,93 @@
+"""
+headless.py
+
+This module contains the headless scan and clean path of the Clean My Windows
+application, used from the command line and by the reporting agent.
+
+Functions:
+- run_headless: Scans and optionally cleans all cache directories.
+"""
+
+
+import socket
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .filters import FileFilter
+from .utils import scan_dir, scan_dir_parallel, get_cache_dirs, clean_dir
+
+
+def run_headless(
+    clean: bool = False,
+    file_filter: FileFilter | None = None,
+    parallel: bool = False,
+) -> dict:
+    """
+    Scan and optionally clean all cache directories without the GUI.
+
+    :param clean: Whether to clean the directories after scanning them
+    :type clean: bool
+    :param file_filter: Filter selecting files, all files if None
+    :type file_filter: FileFilter | None
+    :param parallel: Whether to scan large directories in worker processes
+    :type parallel: bool
+    :return: Result of the run with logical and on-disk sizes, cleaned sizes and
+        timings per directory
+    :rtype: dict
+    """
+    started = time.time()
+    dirs = []
+    # Worker processes are only started once a large directory is found
+    executor = ProcessPoolExecutor() if parallel else None
+
+    try:
+        for name, dir_path in get_cache_dirs():
+            scan_started = time.perf_counter()
+            if executor:
+                found = scan_dir_parallel(dir_path, file_filter, executor)
+            else:
+                found = scan_dir(dir_path, file_filter)
+
+            stat = {
+                "name": name.replace("\n", " "),
+                "path": dir_path,
+                "size": found.size,
+                "matched_size": found.matched_size,
+                "disk_size": found.disk_size,
+                "matched_disk_size": found.matched_disk_size,
+                "scan_time": time.perf_counter() - scan_started,
+            }
+
+            if clean:
+                clean_started = time.perf_counter()
+                cleaned_size, access_denied_files, cleaned_disk_size = clean_dir(
+                    dir_path, file_filter
+                )
+                stat["cleaned_size"] = cleaned_size
+                stat["cleaned_disk_size"] = cleaned_disk_size
+                stat["access_denied_files"] = access_denied_files
+                stat["clean_time"] = time.perf_counter() - clean_started
+
+            dirs.append(stat)
+    finally:
+        if executor:
+            executor.shutdown()
+
+    return {
+        "host": socket.gethostname(),
+        "started": started,
+        "duration": time.time() - started,
+        "filter": file_filter.expression if file_filter else None,
+        "cleaned": clean,
+        "error": None,
+        "size": sum(stat["size"] for stat in dirs),
+        "matched_size": sum(stat["matched_size"] for stat in dirs),
+        "disk_size": sum(stat["disk_size"] for stat in dirs),
+        "matched_disk_size": sum(stat["matched_disk_size"] for stat in dirs),
+        "cleaned_size": sum(stat.get("cleaned_size", 0) for stat in dirs),
+        "cleaned_disk_size": sum(stat.get("cleaned_disk_size", 0) for stat in dirs),
+        "access_denied_files": sum(
+            stat.get("access_denied_files", 0) for stat in dirs
+        ),
+        "dirs": dirs,
+    }
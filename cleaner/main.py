@@ -12,11 +12,14 @@ class App(ctk.CTk):
         __init__: Initializes the App instance.
     """
 
-    def __init__(self):
+    def __init__(self, file_filter=None, parallel=False):
         """
         Initialize the main application window.
 
         Set up window configuration, title, labels, and the main content frame.
+
+        :param file_filter: Filter selecting the files to clean, or None for all.
+        :param parallel: Whether to scan large directories in worker processes.
         """
         super().__init__(fg_color="gray100")
         self.iconbitmap("cleaner\\images\\cmw.ico")
@@ -42,12 +45,14 @@ class App(ctk.CTk):
             self,
             height=(self.height - 2 * self.lbl_title.winfo_reqheight()),
             fg_color="white",
+            file_filter=file_filter,
+            parallel=parallel,
         )
         self.frame.grid(row=1, column=0, sticky="nsew")
 
 
-def main() -> None:
-    app = App()
+def main(file_filter=None, parallel=False) -> None:
+    app = App(file_filter, parallel)
     app.mainloop()
 
 
@@ -4,3 +4,4 @@ from os import path
 USER_TEMP_DIR = path.expanduser(r"~\AppData\Local\Temp")
 SYSTEM_TEMP_DIR = r"C:\Windows\Temp"
 LOCAL_DIR = path.expanduser(r"~\AppData\Local")
+AGENT_SPOOL_DIR = path.join(LOCAL_DIR, "CleanMyWindows", "spool")
@@ -1,8 +1,386 @@
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import repeat
 from re import search, IGNORECASE
+from typing import NamedTuple
+from .filters import FileFilter
 from .paths import USER_TEMP_DIR, SYSTEM_TEMP_DIR, LOCAL_DIR
+from .winapi import get_file_allocation
 from shutil import rmtree
 
+# Rough cost of starting worker processes in seconds, a tree is only scanned in
+# worker processes if that's estimated to save more time than this
+POOL_STARTUP_SECONDS = 0.5
+
+# Max. no. of levels descended to split a tree into partitions
+MAX_SURVEY_DEPTH = 8
+
+# No. of partitions scanned in-process to estimate the scan time of a tree
+SAMPLE_PARTITIONS = 3
+
+# Allocation unit assumed if the allocated size of a file can't be found
+CLUSTER_SIZE = 4096
+
+
+class DirSize(NamedTuple):
+    """
+    Logical and on-disk size of a directory, in total and of the files
+    matching a filter.
+    """
+
+    size: int
+    matched_size: int
+    disk_size: int
+    matched_disk_size: int
+
+
+class _SizeCounter:
+    """
+    Accumulates the logical and on-disk sizes of files.
+
+    Files with more than one hard link are counted once on disk, and count as
+    matching on disk only once all of their links matched, since until then
+    deleting the matching links frees nothing. Only those files are tracked by
+    their (st_dev, st_ino), which keeps the set small even on huge trees.
+    Counters hold plain data, so they can be sent back from worker processes
+    and merged.
+    """
+
+    def __init__(self, counted: dict | None = None):
+        """
+        Initialize the counter.
+
+        :param counted: Hard-linked files already counted by another counter,
+            whose links are added to that count. It's shared, not copied.
+        :type counted: dict | None
+        """
+        self.size = 0
+        self.matched_size = 0
+        self.disk_size = 0
+        self.matched_disk_size = 0
+        # Packed (st_dev, st_ino) of hard-linked files
+        # -> (on-disk size, No. of links, No. of matched links)
+        self.links = {}
+        self.counted = counted if counted is not None else {}
+
+    def add(self, stat, matched: bool, path: str) -> None:
+        """
+        Count a file.
+
+        :param stat: Stat data of the file
+        :type stat: os.stat_result
+        :param matched: Whether the file matches the filter
+        :type matched: bool
+        :param path: Path of the file
+        :type path: str
+        """
+        self.size += stat.st_size
+        if matched:
+            self.matched_size += stat.st_size
+
+        disk_size, links, key = _disk_usage(stat, path)
+
+        # A single link may be the last one of a file whose other links were
+        # deleted while cleaning
+        if links > 1 or key in self.links or key in self.counted:
+            self._add_link(key, disk_size, links, int(matched))
+            return
+
+        self.disk_size += disk_size
+        if matched:
+            self.matched_disk_size += disk_size
+
+    def merge(self, other: "_SizeCounter") -> None:
+        """
+        Add the sizes counted by another counter.
+
+        :param other: Counter to add
+        :type other: _SizeCounter
+        """
+        self.size += other.size
+        self.matched_size += other.matched_size
+        self.disk_size += other.disk_size
+        self.matched_disk_size += other.matched_disk_size
+        for key, (disk_size, links, matched_links) in other.links.items():
+            self._add_link(key, disk_size, links, matched_links)
+
+    def _add_link(
+        self, key: int, disk_size: int, links: int, matched_links: int
+    ) -> None:
+        """
+        Count links of a hard-linked file.
+
+        The No. of links is kept from when the file was first counted, since
+        deleting links while cleaning lowers it.
+
+        :param key: Packed (st_dev, st_ino) of the file
+        :type key: int
+        :param disk_size: Allocated size of the file in bytes
+        :type disk_size: int
+        :param links: No. of links of the file
+        :type links: int
+        :param matched_links: No. of the counted links that match the filter
+        :type matched_links: int
+        """
+        link = self.links.get(key) or self.counted.get(key)
+        if link is None:
+            self.links[key] = (disk_size, links, matched_links)
+        elif key not in self.links:
+            self.links[key] = (link[0], link[1], matched_links)
+        else:
+            self.links[key] = (link[0], link[1], link[2] + matched_links)
+
+    def result(self) -> DirSize:
+        """Return the counted sizes."""
+        disk_size = self.disk_size
+        matched_disk_size = self.matched_disk_size
+
+        for link_disk_size, links, matched_links in self.links.values():
+            disk_size += link_disk_size
+            if matched_links >= links:
+                matched_disk_size += link_disk_size
+
+        return DirSize(self.size, self.matched_size, disk_size, matched_disk_size)
+
+
+def _disk_usage(stat, path: str) -> tuple:
+    """
+    Return the no. of bytes a file occupies on disk, its links and its id.
+
+    Uses the allocated blocks where stat data reports them. On Windows it
+    doesn't, so the allocated size and links are asked from the file system,
+    which takes one extra call per file. Both account for sparse files and
+    block overhead. If neither works, the size is rounded up to `CLUSTER_SIZE`.
+
+    :param stat: Stat data of the file
+    :type stat: os.stat_result
+    :param path: Path of the file
+    :type path: str
+    :return: Allocated size in bytes, No. of links and a key identifying the file
+    :rtype: tuple
+    """
+    key = stat.st_dev << 64 | stat.st_ino
+
+    blocks = getattr(stat, "st_blocks", None)
+    if blocks is not None:
+        return blocks * 512, stat.st_nlink, key
+
+    allocation = get_file_allocation(path)
+    if allocation is not None:
+        return allocation
+
+    return -(-stat.st_size // CLUSTER_SIZE) * CLUSTER_SIZE, stat.st_nlink, key
+
+
+def _walk_files(dir_path: str):
+    """
+    Yield a DirEntry for every file below a directory.
+
+    Directories that can't be read are skipped, like `os.walk` does.
+
+    :param dir_path: Path of directory
+    :type dir_path: str
+    """
+    stack = [dir_path]
+
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        else:
+                            yield entry
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+
+
+def scan_dir(dir_path: str, file_filter: FileFilter | None = None) -> DirSize:
+    """
+    Return total and matching sizes of a directory in a single pass.
+
+    The filter is evaluated against the stat data of the `DirEntry`, so no
+    extra stat calls are made for it.
+
+    :param dir_path: Path of directory
+    :type dir_path: str
+    :param file_filter: Filter selecting files, all files match if None
+    :type file_filter: FileFilter | None
+    :return: Logical and on-disk sizes of the directory in bytes
+    :rtype: DirSize
+    """
+    return _scan_tree(dir_path, file_filter).result()
+
+
+def _scan_tree(
+    dir_path: str,
+    file_filter: FileFilter | None,
+    counter: _SizeCounter | None = None,
+) -> _SizeCounter:
+    """
+    Count the sizes of all files below a directory.
+
+    :param dir_path: Path of directory
+    :type dir_path: str
+    :param file_filter: Filter selecting files, all files match if None
+    :type file_filter: FileFilter | None
+    :param counter: Counter to add the sizes to, a new one is created if None
+    :type counter: _SizeCounter | None
+    :return: Counted sizes
+    :rtype: _SizeCounter
+    """
+    if counter is None:
+        counter = _SizeCounter()
+
+    for entry in _walk_files(dir_path):
+        try:
+            stat = entry.stat(follow_symlinks=False)
+        except OSError:
+            continue
+
+        matched = file_filter is None or file_filter.matches(entry.name, stat)
+        counter.add(stat, matched, entry.path)
+
+    return counter
+
+
+def _list_dir(
+    dir_path: str, file_filter: FileFilter | None, counter: _SizeCounter
+) -> list:
+    """
+    Count the sizes of the files directly inside a directory.
+
+    :param dir_path: Path of directory
+    :type dir_path: str
+    :param file_filter: Filter selecting files, all files match if None
+    :type file_filter: FileFilter | None
+    :param counter: Counter to add the sizes to
+    :type counter: _SizeCounter
+    :return: Paths of the subdirectories
+    :rtype: list
+    """
+    subdirs = []
+
+    try:
+        with os.scandir(dir_path) as dir_entries:
+            for entry in dir_entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                        continue
+                    stat = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+
+                matched = file_filter is None or file_filter.matches(entry.name, stat)
+                counter.add(stat, matched, entry.path)
+    except OSError:
+        pass
+
+    return subdirs
+
+
+def scan_dir_parallel(
+    dir_path: str,
+    file_filter: FileFilter | None = None,
+    executor: ProcessPoolExecutor | None = None,
+) -> DirSize:
+    """
+    Return the same result as `scan_dir`, scanning large trees in worker processes.
+
+    The tree is descended level by level in-process until it splits into
+    enough partitions to keep the workers busy, which also gets past narrow
+    levels like those of the npm `_cacache`. A few of the partitions are then
+    scanned in-process and their scan time is extrapolated to the rest. If
+    scanning the rest in worker processes is estimated to save more than
+    `POOL_STARTUP_SECONDS`, the partitions are scanned there, each sending back
+    only its counted sizes. Otherwise, or if the pool fails, they are scanned
+    in-process.
+
+    :param dir_path: Path of directory
+    :type dir_path: str
+    :param file_filter: Filter selecting files, all files match if None
+    :type file_filter: FileFilter | None
+    :param executor: Pool to scan in, a temporary one is created if None
+    :type executor: ProcessPoolExecutor | None
+    :return: Logical and on-disk sizes of the directory in bytes
+    :rtype: DirSize
+    """
+    counter = _SizeCounter()
+    workers = os.cpu_count() or 1
+
+    # Split into several partitions per worker, so that a subtree much larger
+    # than the others is still spread over the workers
+    partitions = [dir_path]
+    depth = 0
+    while partitions and len(partitions) < 8 * workers and depth < MAX_SURVEY_DEPTH:
+        children = []
+        for partition in partitions:
+            children.extend(_list_dir(partition, file_filter, counter))
+        partitions = children
+        depth += 1
+
+    # Scan evenly spread sample partitions to estimate the time for the rest
+    step = max(1, len(partitions) // SAMPLE_PARTITIONS)
+    samples = set(partitions[::step][:SAMPLE_PARTITIONS])
+    started = time.perf_counter()
+    for partition in samples:
+        _scan_tree(partition, file_filter, counter)
+    sample_time = (time.perf_counter() - started) / max(1, len(samples))
+
+    partitions = [partition for partition in partitions if partition not in samples]
+    saved_time = sample_time * len(partitions) * (1 - 1 / workers)
+
+    results = None
+    if len(partitions) > 1 and saved_time > POOL_STARTUP_SECONDS:
+        results = _scan_partitions(partitions, file_filter, executor)
+
+    if results is None:
+        results = (_scan_tree(partition, file_filter) for partition in partitions)
+
+    for found in results:
+        counter.merge(found)
+
+    return counter.result()
+
+
+def _scan_partitions(
+    partitions: list,
+    file_filter: FileFilter | None,
+    executor: ProcessPoolExecutor | None,
+) -> list | None:
+    """
+    Scan directories in worker processes.
+
+    :param partitions: Paths of directories to scan
+    :type partitions: list
+    :param file_filter: Filter selecting files, all files match if None
+    :type file_filter: FileFilter | None
+    :param executor: Pool to scan in, a temporary one is created if None
+    :type executor: ProcessPoolExecutor | None
+    :return: Counted sizes of the directories, or None if the pool couldn't be used
+    :rtype: list | None
+    """
+    try:
+        if executor is None:
+            with ProcessPoolExecutor() as executor:
+                return _scan_partitions(partitions, file_filter, executor)
+
+        # Send several partitions per task to keep the IPC overhead low
+        chunksize = max(1, len(partitions) // (4 * (os.cpu_count() or 1)))
+        return list(
+            executor.map(
+                _scan_tree, partitions, repeat(file_filter), chunksize=chunksize
+            )
+        )
+    except (OSError, BrokenProcessPool):
+        return None
+
 
 def get_dir_size(dir_path: str) -> int:
     """
@@ -13,12 +391,7 @@ def get_dir_size(dir_path: str) -> int:
     :return: Size of the directory in bytes
     :rtype: int
     """
-    size = 0
-
-    for root, _, files in os.walk(dir_path):
-        size += sum(os.path.getsize(os.path.join(root, name)) for name in files)
-
-    return size
+    return scan_dir(dir_path).size
 
 
 def get_formatted_size(size: int) -> str:
@@ -59,42 +432,114 @@ def get_cache_dirs():
     yield ["System\nTemp", SYSTEM_TEMP_DIR]
 
 
-def clean_dir(dir: str) -> list:
+def clean_dir(dir: str, file_filter: FileFilter | None = None) -> list:
     """
     Clean a directory.
 
+    If a filter is given, only the matching files are deleted and the
+    directory tree itself is left in place.
+
     :param dir: Path of a directory
     :type dir: str
-    :return: List of Cleaned size and No. of files that couldn't be deleted
+    :param file_filter: Filter selecting files to delete, all files if None
+    :type file_filter: FileFilter | None
+    :return: List of Cleaned size, No. of files that couldn't be deleted and
+        Size freed on disk
     :rtype: list
     """
-    cleaned_size = 0
+    cleaned = _SizeCounter()
     access_denied_files = 0
 
     if not os.path.exists(dir):
-        return [0, 0]
+        return [0, 0, 0]
+
+    if file_filter is not None:
+        return _clean_matching(dir, file_filter)
 
     try:
         files = os.listdir(dir)
 
-        if not files:
-            return [cleaned_size, access_denied_files]
-
         for file in files:
             path = os.path.join(dir, file)
+            # Add to the hard-linked files counted so far, since deleting their
+            # other links may have left them with a single link
+            found = _SizeCounter(cleaned.links)
             try:
                 if not os.path.isdir(path):
-                    file_size = os.path.getsize(path)
+                    found.add(os.lstat(path), True, path)
                     os.remove(path)
                 else:
-                    file_size = get_dir_size(path)
-                    rmtree(path)
-            except PermissionError:
+                    _scan_tree(path, None, found)
+                    rmtree(path, onerror=_ignore_missing)
+            except FileNotFoundError:
+                # Removed by someone else meanwhile, e.g. the app that created it
+                continue
+            except OSError:
                 access_denied_files += 1
                 continue
             else:
-                cleaned_size += file_size
-    except PermissionError:
+                cleaned.merge(found)
+    except OSError:
         access_denied_files += 1
 
-    return [cleaned_size, access_denied_files]
+    cleaned_size = cleaned.result()
+    # Every deleted file counts as matched, so this leaves out hard-linked
+    # files that still have links left
+    return [cleaned_size.size, access_denied_files, cleaned_size.matched_disk_size]
+
+
+def _ignore_missing(function, path: str, exc_info: tuple) -> None:
+    """
+    Handle an error of `rmtree`, ignoring files that were removed meanwhile.
+
+    :param function: Function that raised the error
+    :param path: Path passed to the function
+    :type path: str
+    :param exc_info: Exception info, as returned by `sys.exc_info`
+    :type exc_info: tuple
+    """
+    if not issubclass(exc_info[0], FileNotFoundError):
+        raise exc_info[1]
+
+
+def _clean_matching(dir: str, file_filter: FileFilter) -> list:
+    """
+    Delete the files matching a filter below a directory.
+
+    :param dir: Path of a directory
+    :type dir: str
+    :param file_filter: Filter selecting files to delete
+    :type file_filter: FileFilter
+    :return: List of Cleaned size, No. of files that couldn't be deleted and
+        Size freed on disk
+    :rtype: list
+    """
+    cleaned = _SizeCounter()
+    access_denied_files = 0
+
+    for entry in _walk_files(dir):
+        try:
+            stat = entry.stat(follow_symlinks=False)
+        except OSError:
+            continue
+
+        if not file_filter.matches(entry.name, stat):
+            continue
+
+        # Count before deleting, since finding the size on disk needs the file
+        found = _SizeCounter(cleaned.links)
+        found.add(stat, True, entry.path)
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:
+            # Removed by someone else meanwhile, e.g. the app that created it
+            continue
+        except OSError:
+            access_denied_files += 1
+        else:
+            cleaned.merge(found)
+
+    cleaned_size = cleaned.result()
+    # Every deleted file counts as matched, so this leaves out hard-linked
+    # files that still have links left
+    return [cleaned_size.size, access_denied_files, cleaned_size.matched_disk_size]
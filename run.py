@@ -1,6 +1,9 @@
 import argparse
+import json
 from os import system
 
+from cleaner.filters import compile_filter
+
 
 def main():
     # Parse command-line arguments
@@ -8,6 +11,45 @@ def main():
         prog="Clean My Windows", description="Cleans junk files."
     )
     parser.add_argument("-i", "--install")
+    parser.add_argument(
+        "-f",
+        "--filter",
+        type=parse_filter,
+        help='Only clean matching files, e.g. "age>7d size>1MB !*.lock"',
+    )
+    parser.add_argument(
+        "-p",
+        "--parallel",
+        action="store_true",
+        help="Scan large directories in multiple processes",
+    )
+    parser.add_argument(
+        "--headless",
+        action="store_true",
+        help="Scan without the GUI and print the results as JSON",
+    )
+    parser.add_argument(
+        "--clean",
+        action="store_true",
+        help="Clean after scanning, in headless and agent mode",
+    )
+    parser.add_argument(
+        "--agent",
+        metavar="URL",
+        help="Scan periodically and report the results to a collector",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=600,
+        help="Seconds between runs in agent mode (default: 600)",
+    )
+    parser.add_argument(
+        "--collector",
+        metavar="PORT",
+        type=int,
+        help="Run a local collector for agent reports",
+    )
     args = parser.parse_args()
 
     # If install argument is provided, install requirements and provide instructions
@@ -16,10 +58,38 @@ def main():
         print("Requirements installed. To run the program, use: python run.py")
         return
 
+    if args.collector:
+        from cleaner.collector import serve
+
+        serve(args.collector)
+        return
+
+    if args.agent:
+        from cleaner.agent import run_agent
+
+        expression = args.filter.expression if args.filter else None
+        run_agent(args.agent, args.interval, args.clean, expression, args.parallel)
+        return
+
+    if args.headless:
+        from cleaner.headless import run_headless
+
+        result = run_headless(args.clean, args.filter, args.parallel)
+        print(json.dumps(result, indent=2))
+        return
+
     # Import and run the main program
     from cleaner.main import main
 
-    main()
+    main(args.filter, args.parallel)
+
+
+def parse_filter(expression):
+    """Compile a filter expression, reporting invalid ones to argparse."""
+    try:
+        return compile_filter(expression)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
 
 
 def install_requirements():